@@ -1,12 +1,18 @@
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
 from pathlib import Path
+import os
+import re
 import unicodedata
 import io
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 # ===============================
 # 기본 설정
@@ -39,40 +45,142 @@ SCHOOL_INFO = {
     "동산고": 8.0,
 }
 
+# 학교명은 범주형, 환경 측정값은 float32로 저장해 메모리 절감
+SCHOOL_DTYPE = pd.CategoricalDtype(list(SCHOOL_INFO))
+
+# 시각화·요약에 쓰는 열만 파싱
+ENV_DTYPES = {
+    "temperature": "float32",
+    "ec": "float32",
+}
+GROWTH_COLUMNS = ["생중량(g)"]
+
 # ===============================
 # 한글 파일명 안전 처리
 # ===============================
 def normalize(text, form):
     return unicodedata.normalize(form, text)
 
+@lru_cache(maxsize=1)
+def _dir_index(directory_str: str):
+    # 디렉터리를 한 번만 훑어 NFC 파일명 → 경로 색인 생성
+    return {
+        normalize(p.name, "NFC"): p
+        for p in Path(directory_str).iterdir()
+        if p.is_file()
+    }
+
 def find_file(directory: Path, filename: str):
-    for p in directory.iterdir():
-        if not p.is_file():
-            continue
-        for form in ["NFC", "NFD"]:
-            if normalize(p.name, form) == normalize(filename, form):
-                return p
-    return None
+    key = normalize(filename, "NFC")
+    path = _dir_index(str(directory)).get(key)
+    if path is None or not path.is_file():
+        # 색인 이후 추가·삭제·이름 변경된 파일일 수 있으므로 한 번 다시 훑기
+        _dir_index.cache_clear()
+        path = _dir_index(str(directory)).get(key)
+    return path
+
+# ===============================
+# Parquet 캐시 (원본 mtime 기준)
+# ===============================
+CACHE_DIR = DATA_DIR / ".cache"
+CACHE_VERSION = 5  # 캐시 스키마(dtype 등)가 바뀌면 올리기
+
+def read_with_cache(path: Path, reader):
+    stem = normalize(path.stem, "NFC")
+    mtime = int(path.stat().st_mtime)
+    cache_path = CACHE_DIR / f"{stem}_{mtime}_v{CACHE_VERSION}.parquet"
+    if cache_path.exists():
+        try:
+            return pd.read_parquet(cache_path, engine="pyarrow")
+        except (OSError, pa.ArrowException):
+            pass  # 손상된 캐시는 무시하고 원본에서 다시 읽기
+
+    df = reader(path)
+    try:
+        write_cache(df, cache_path, stem)
+    except (OSError, pa.ArrowException):
+        pass  # 읽기 전용 디렉터리 등: 캐시 없이 계속 진행
+    return df
+
+def write_cache(df, cache_path: Path, stem: str):
+    # 임시 파일에 쓴 뒤 교체해 중단돼도 잘린 Parquet이 남지 않게 함
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp, engine="pyarrow", compression="zstd")
+        os.chmod(tmp, 0o644)  # mkstemp 기본 권한(0600) 대신 일반 파일 권한
+        os.replace(tmp, cache_path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+    # 같은 원본의 이전 mtime·버전 캐시만 정리 ({stem}_{mtime}_v{버전}.parquet)
+    pattern = re.compile(rf"{re.escape(stem)}_\d+_v\d+\.parquet")
+    for old in CACHE_DIR.iterdir():
+        if old != cache_path and pattern.fullmatch(normalize(old.name, "NFC")):
+            old.unlink(missing_ok=True)
 
 # ===============================
 # 데이터 로딩
 # ===============================
-@st.cache_data
+# 로더 결과는 st.cache_resource로 공유(피클 복사 없음)하므로
+# 반환된 DataFrame을 직접 수정하지 말 것
+def read_env_csv(path: Path):
+    return pd.read_csv(
+        path,
+        usecols=list(ENV_DTYPES),
+        dtype=ENV_DTYPES
+    )
+
+@st.cache_resource
 def load_env_data():
     with st.spinner("환경 데이터 로딩 중..."):
-        env = {}
+        paths = {}
         for school in SCHOOL_INFO:
             fname = f"{school}_환경데이터.csv"
             path = find_file(DATA_DIR, fname)
             if path is None:
                 st.error(f"❌ 환경 데이터 없음: {fname}")
                 return None
-            df = pd.read_csv(path)
-            df["school"] = school
-            env[school] = df
+            paths[school] = path
+
+        # 학교별 CSV는 서로 독립적이므로 동시에 읽기
+        with ThreadPoolExecutor(max_workers=len(paths)) as ex:
+            futures = {
+                school: ex.submit(read_with_cache, path, read_env_csv)
+                for school, path in paths.items()
+            }
+
+            env = {}
+            for school, future in futures.items():
+                df = future.result()
+                df["school"] = pd.Series(school, index=df.index, dtype=SCHOOL_DTYPE)
+                env[school] = df
     return env
 
-@st.cache_data
+def read_growth_xlsx(path: Path):
+    # 시트(학교)별 데이터를 하나로 합쳐 Parquet 한 파일로 캐시
+    sheets = pd.read_excel(
+        path,
+        sheet_name=None,
+        usecols=GROWTH_COLUMNS,
+        engine="calamine"
+    )
+    # 시트명(dict 키)을 NFC로 맞춰 school 열로 사용
+    sheets = {normalize(name, "NFC"): df for name, df in sheets.items()}
+    df = (
+        pd.concat(sheets, names=["school", None])
+        .reset_index(level="school")
+        .reset_index(drop=True)
+    )
+    for c in df.select_dtypes("float"):
+        df[c] = pd.to_numeric(df[c], downcast="float")
+    for c in df.select_dtypes("integer"):
+        df[c] = pd.to_numeric(df[c], downcast="integer")
+    return df
+
+@st.cache_resource
 def load_growth_data():
     with st.spinner("생육 데이터 로딩 중..."):
         path = find_file(DATA_DIR, "4개교_생육결과데이터.xlsx")
@@ -80,12 +188,21 @@ def load_growth_data():
             st.error("❌ 생육 결과 XLSX 파일 없음")
             return None
 
-        xls = pd.ExcelFile(path)
-        data = {}
-        for sheet in xls.sheet_names:
-            df = pd.read_excel(xls, sheet_name=sheet)
-            df["school"] = sheet
-            data[sheet] = df
+        growth_all = read_with_cache(path, read_growth_xlsx)
+
+        # 범주형 변환 시 SCHOOL_INFO에 없는 시트는 NaN이 되어 사라지므로 먼저 확인
+        unknown = set(growth_all["school"]) - set(SCHOOL_INFO)
+        if unknown:
+            st.error(f"❌ 알 수 없는 학교 시트: {', '.join(sorted(unknown))}")
+            return None
+        growth_all["school"] = growth_all["school"].astype(SCHOOL_DTYPE)
+
+        data = {
+            sheet: df.reset_index(drop=True)
+            for sheet, df in growth_all.groupby(
+                "school", sort=False, observed=True
+            )
+        }
     return data
 
 env_data = load_env_data()
@@ -94,6 +211,165 @@ growth_data = load_growth_data()
 if env_data is None or growth_data is None:
     st.stop()
 
+# ===============================
+# 학교별 요약 (탭 공통)
+# ===============================
+@st.cache_resource
+def combine_data(env_data, growth_data):
+    # 탭마다 다시 합치지 않도록 한 번만 결합
+    # (필요한 열만 남기는 작업은 파싱 단계의 usecols에서 처리)
+    env_all = pd.concat(env_data.values(), ignore_index=True)
+    growth_all = pd.concat(growth_data.values(), ignore_index=True)
+    return env_all, growth_all
+
+@st.cache_data
+def build_summaries(env_all, growth_all):
+    env_mean_df = (
+        env_all.groupby("school", observed=True)
+        [["temperature", "ec"]]
+        .mean()
+        .reset_index()
+    )
+
+    # 개요 표는 원본 워크북의 시트 순서를 유지
+    growth_mean_df = (
+        growth_all.groupby("school", sort=False, observed=True)
+        .agg(
+            weight=("생중량(g)", "mean"),
+            count=("생중량(g)", "size")
+        )
+        .reset_index()
+    )
+    growth_mean_df["ec"] = growth_mean_df["school"].map(SCHOOL_INFO).astype(float)
+
+    # 학교당 한 행씩이어야 하므로 1:1 조인으로 검증
+    merged_df = env_mean_df.merge(
+        growth_mean_df[["school", "weight"]],
+        on="school",
+        how="inner",
+        validate="one_to_one"
+    )
+    return growth_mean_df, merged_df
+
+env_all, growth_all = combine_data(env_data, growth_data)
+growth_mean_df, merged = build_summaries(env_all, growth_all)
+
+@st.cache_data
+def to_xlsx_bytes(df: pd.DataFrame) -> bytes:
+    # 재실행마다 엑셀을 새로 쓰지 않도록 직렬화 결과를 캐시
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False, engine="xlsxwriter")
+    return buffer.getvalue()
+
+# ===============================
+# 대용량 산점도 래스터화
+# ===============================
+# 이 개수를 넘으면 원본 점 대신 서버에서 집계한 이미지를 전송
+# (datashader는 선택 의존성: 없으면 WebGL 산점도로 대체)
+RASTER_THRESHOLD = 100_000
+
+def raster_scatter(df, x, y, color, labels, width=600, height=400):
+    try:
+        import datashader as ds
+        import datashader.transfer_functions as tf
+    except ImportError:
+        return None
+
+    cvs = ds.Canvas(plot_width=width, plot_height=height)
+    agg = cvs.points(df, x, y, ds.count_cat(color))
+
+    color_key = dict(zip(df[color].cat.categories, px.colors.qualitative.Plotly))
+    img = tf.shade(agg, color_key=color_key, how="eq_hist")
+    rgba = img.data.view(np.uint8).reshape(img.shape + (4,))
+
+    fig = px.imshow(
+        rgba,
+        x=agg.coords[x].values,
+        y=agg.coords[y].values,
+        origin="lower",
+        aspect="auto"
+    )
+    fig.update_xaxes(title=labels.get(x, x))
+    fig.update_yaxes(title=labels.get(y, y))
+
+    # 이미지 trace에는 범례가 없으므로 학교별 색상 범례만 추가
+    for name, c in color_key.items():
+        fig.add_trace(go.Scatter(
+            x=[None], y=[None], mode="markers",
+            marker=dict(color=c), name=name
+        ))
+    return fig
+
+# ===============================
+# 그래프 생성 (캐시)
+# ===============================
+@st.cache_data
+def make_env_scatter(env_all):
+    labels = {
+        "temperature": "온도 (℃)",
+        "ec": "EC"
+    }
+
+    fig = None
+    if len(env_all) > RASTER_THRESHOLD:
+        fig = raster_scatter(env_all, "temperature", "ec", "school", labels)
+    if fig is None:
+        fig = px.scatter(
+            env_all,
+            x="temperature",
+            y="ec",
+            color="school",
+            opacity=0.7,
+            labels=labels,
+            render_mode="webgl"
+        )
+
+    fig.update_layout(font=PLOTLY_FONT)
+    return fig.to_dict()
+
+@st.cache_data
+def make_bubble(merged):
+    fig = px.scatter(
+        merged,
+        x="temperature",
+        y="weight",
+        size="ec",
+        color="school",
+        labels={
+            "temperature": "평균 온도 (℃)",
+            "weight": "평균 생중량 (g)",
+            "ec": "EC"
+        }
+    )
+
+    fig.update_layout(font=PLOTLY_FONT)
+    return fig.to_dict()
+
+@st.cache_data
+def make_heatmap(merged):
+    # 학교 수(4행)만큼의 작은 행렬이므로 피어슨 상관을 직접 계산
+    corr_cols = ["temperature", "ec", "weight"]
+    arr = merged[corr_cols].to_numpy(dtype=np.float64)
+    arr = arr - arr.mean(axis=0)
+    arr = arr / np.linalg.norm(arr, axis=0)
+    corr = arr.T @ arr
+
+    fig = go.Figure(
+        data=go.Heatmap(
+            z=corr,
+            x=corr_cols,
+            y=corr_cols,
+            colorscale="RdBu",
+            zmid=0
+        )
+    )
+
+    fig.update_layout(
+        font=PLOTLY_FONT,
+        height=500
+    )
+    return fig.to_dict()
+
 # ===============================
 # 사이드바
 # ===============================
@@ -126,15 +402,13 @@ with tab1:
 - **전처리 없이 단순 평균을 사용하는 경우**, 연구 결론에 큰 영향을 미칠 수 있다.
 """)
 
-    info = []
-    for s, df in growth_data.items():
-        info.append({
-            "학교": s,
-            "EC 조건": SCHOOL_INFO[s],
-            "개체 수": len(df)
-        })
+    info = pd.DataFrame({
+        "학교": growth_mean_df["school"].astype(str),
+        "EC 조건": growth_mean_df["ec"],
+        "개체 수": growth_mean_df["count"]
+    })
 
-    st.dataframe(pd.DataFrame(info), use_container_width=True)
+    st.dataframe(info, use_container_width=True)
 
 # ===============================
 # Tab 2: EC & 온도 산점도
@@ -142,22 +416,7 @@ with tab1:
 with tab2:
     st.subheader("학교별 EC–온도 조건 분포")
 
-    env_all = pd.concat(env_data.values(), ignore_index=True)
-
-    fig_scatter = px.scatter(
-        env_all,
-        x="temperature",
-        y="ec",
-        color="school",
-        opacity=0.7,
-        labels={
-            "temperature": "온도 (℃)",
-            "ec": "EC"
-        }
-    )
-
-    fig_scatter.update_layout(font=PLOTLY_FONT)
-    st.plotly_chart(fig_scatter, use_container_width=True)
+    st.plotly_chart(make_env_scatter(env_all), use_container_width=True)
 
     st.caption("▶ 학교별 EC 수준과 온도 분포를 직관적으로 비교")
 
@@ -167,43 +426,8 @@ with tab2:
 with tab3:
     st.subheader("EC·온도 조건별 생중량 비교")
 
-    # 환경 평균 + 생육 평균 결합
-    env_mean = []
-    for s, df in env_data.items():
-        env_mean.append({
-            "school": s,
-            "temperature": df["temperature"].mean(),
-            "ec": df["ec"].mean()
-        })
-
-    env_mean_df = pd.DataFrame(env_mean)
-
-    growth_mean = []
-    for s, df in growth_data.items():
-        growth_mean.append({
-            "school": s,
-            "weight": df["생중량(g)"].mean()
-        })
-
-    growth_mean_df = pd.DataFrame(growth_mean)
-
-    merged = pd.merge(env_mean_df, growth_mean_df, on="school")
-
-    fig_bubble = px.scatter(
-        merged,
-        x="temperature",
-        y="weight",
-        size="ec",
-        color="school",
-        labels={
-            "temperature": "평균 온도 (℃)",
-            "weight": "평균 생중량 (g)",
-            "ec": "EC"
-        }
-    )
-
-    fig_bubble.update_layout(font=PLOTLY_FONT)
-    st.plotly_chart(fig_bubble, use_container_width=True)
+    # 환경 평균 + 생육 평균 결합 (build_summaries 결과 재사용)
+    st.plotly_chart(make_bubble(merged), use_container_width=True)
 
     st.markdown("⭐ **EC 4.0 (아라고)** 조건에서 저온 대비 생중량이 가장 높게 나타남")
 
@@ -212,36 +436,15 @@ with tab3:
     # ===============================
     st.subheader("온도 · EC · 생중량 상관관계")
 
-    corr_df = merged[["temperature", "ec", "weight"]].corr()
-
-    fig_heat = go.Figure(
-        data=go.Heatmap(
-            z=corr_df.values,
-            x=corr_df.columns,
-            y=corr_df.columns,
-            colorscale="RdBu",
-            zmid=0
-        )
-    )
-
-    fig_heat.update_layout(
-        font=PLOTLY_FONT,
-        height=500
-    )
-
-    st.plotly_chart(fig_heat, use_container_width=True)
+    st.plotly_chart(make_heatmap(merged), use_container_width=True)
 
     # ===============================
     # 다운로드
     # ===============================
     with st.expander("📥 분석 데이터 다운로드"):
-        buffer = io.BytesIO()
-        merged.to_excel(buffer, index=False, engine="openpyxl")
-        buffer.seek(0)
-
         st.download_button(
             "XLSX 다운로드",
-            data=buffer,
+            data=to_xlsx_bytes(merged),
             file_name="EC_온도_생중량_분석결과.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )